@@ -4,8 +4,7 @@ import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 from config import AppConfig
 from data_processing import (
-    load_data, clean_column_names, map_lifecycle_state,
-    calculate_savings, calculate_summary_metrics, group_lp_status_weekly,
+    load_data, calculate_savings, calculate_summary_metrics, group_lp_status_weekly,
     filter_and_group_toll_transactions, group_active_lp_sources_weekly,
     read_sla_trend_data
 )
@@ -15,10 +14,8 @@ from visualization import (
     plot_sla_trend_line, plot_savings_trend
 )
 
-# Load and process data
-data = load_data(AppConfig.DATA_FILE_PATH)
-merged_data = clean_column_names(data)
-merged_data = map_lifecycle_state(merged_data)
+# Load and normalize data
+merged_data = load_data(AppConfig.DATA_FILE_PATH)
 
 # Calculate metrics
 weekly_savings_summary = calculate_savings(merged_data)
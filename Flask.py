@@ -1,4 +1,13 @@
-from flask import Flask, render_template, jsonify, request, make_response
+import os
+
+# Each open dashboard keeps an event stream connected; under gevent those idle
+# connections are greenlets instead of one OS thread each
+SERVE_MODE = os.getenv("SERVE_MODE", "threaded")
+if SERVE_MODE == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+from flask import Flask, Response, render_template, jsonify, request, make_response, send_file
 import plotly.express as px
 import plotly.graph_objs as go
 import pandas as pd
@@ -6,7 +15,12 @@ from sqlalchemy import create_engine
 import json
 from datetime import datetime
 from dotenv import load_dotenv
-import os
+import gzip
+
+import live_updates
+import prerender
+import single_flight
+from Amazon_Dashboard.data_processing import run_ingest_pipeline
 
 # Load .env file
 load_dotenv()
@@ -20,30 +34,25 @@ host = os.getenv("DB_HOST")
 db_url = f"postgresql+psycopg2://{user}:{password}@{host}/{dbname}"
 engine = create_engine(db_url)
  
-# Load data
 query = "SELECT * FROM merged_data;"
-merged_data_df = pd.read_sql_query(query, engine)
- 
-# Remove timezone information
-for col in merged_data_df.select_dtypes(include=['datetime64[ns]', 'datetime64[ns, UTC]']).columns:
-    if merged_data_df[col].dt.tz is not None:
-        merged_data_df[col] = merged_data_df[col].dt.tz_convert(None)
-    merged_data_df[col] = merged_data_df[col].dt.tz_localize(None)
+ingest_chunksize = int(os.getenv("INGEST_CHUNKSIZE", "50000"))
  
 app = Flask(__name__, template_folder="C:/Users/RamadhanZome/Desktop/AMAZON/ANALYSIS CODE AND DATA/templates")
  
-# Helper functions
-def map_lifecycle_state(data):
-    status_mapping = {
-        'End of Life': 'End of Life',
-        'Active': 'Active',
-        'Ordered': 'Active',
-        'Unavailable': 'Active',
-        'Unknown State': 'Unknown State'
-    }
-    data['Lifecycle state'] = data['Lifecycle state'].map(status_mapping).fillna('Unknown State')
-    return data
+# In gevent mode pandas/Plotly work runs on a bounded pool of native threads, so a
+# slow figure build cannot block the event loop that serves cheap routes like /get_years
+if SERVE_MODE == "gevent":
+    from gevent.threadpool import ThreadPoolExecutor
+    figure_executor = ThreadPoolExecutor(max_workers=int(os.getenv("FIGURE_WORKERS", "4")))
+else:
+    figure_executor = None
  
+def run_figure_work(compute, *args):
+    if figure_executor is None:
+        return compute(*args)
+    return figure_executor.submit(compute, *args).result()
+ 
+# Helper functions
 def plot_lp_status_weekly(lp_status_weekly, weeks):
     filtered_data = lp_status_weekly[lp_status_weekly['WEEK'].isin(weeks)]
     filtered_data_melted = pd.melt(filtered_data, id_vars=['WEEK'], value_vars=['Active', 'End of Life', 'Unknown State'], var_name='Lifecycle state', value_name='Number of LPs')
@@ -155,7 +164,7 @@ def plot_sla_trend_line(filtered_sla_trend_df):
     return fig
  
 def calculate_savings(merged_data_df):
-    merged_data_df['Savings'] = merged_data_df['HIGH RATES'] - merged_data_df['AMOUNT']
+    # 'Savings' is derived during ingest
     weekly_savings_summary = merged_data_df.groupby('WEEK')['Savings'].agg(['sum', 'mean']).reset_index()
     weekly_savings_summary.columns = ['Week', 'Total Savings', 'Average Savings']
    
@@ -188,20 +197,45 @@ def calculate_percentage_within_sla(merged_data_df, selected_weeks):
         percentage_within_sla = 0  
     return percentage_within_sla
  
-# Ensure YEAR and WEEK columns are included in the grouped data
+def refresh_data():
+    global merged_data_df, DATA_VERSION, weekly_savings_summary, lp_status_weekly, active_lp_df, toll_transactions_df
+    global toll_transactions_weekly, active_lp_weekly, sla_trend_df, unique_weeks, week_options
+ 
+    # Load data in chunks; column names, lifecycle states, timezones, types and Savings are normalized per chunk
+    data = run_ingest_pipeline(pd.read_sql_query(query, engine, chunksize=ingest_chunksize))
+ 
+    # Pre-rendered payloads are only served when they were built from this exact data
+    DATA_VERSION = prerender.data_version(data)
+ 
+    # Ensure YEAR and WEEK columns are included in the grouped data
+    weekly_savings_summary = calculate_savings(data)
+    lp_status_weekly = data.groupby(['YEAR', 'WEEK', 'Lifecycle state'], observed=True)['LICENSE PLATE'].nunique().unstack(fill_value=0).reset_index()
+    active_lp_df = data[(data['Lifecycle state'] == 'Active') & (data['REPORT TYPE'] != 'TRAILER')]
+    toll_transactions_df = active_lp_df[active_lp_df['TRANSACTION TYPE'].isin(['Transponder Toll', 'Plate Toll'])]
+    toll_transactions_weekly = toll_transactions_df.groupby(['YEAR', 'WEEK', 'TRANSACTION TYPE'])['LICENSE PLATE'].nunique().reset_index(name='Count')
+    active_lp_weekly = active_lp_df.groupby(['YEAR', 'WEEK', 'SOURCE']).size().reset_index(name='Count')
+    sla_trend_df = data.groupby(['YEAR', 'WEEK', 'SLA MET']).size().reset_index(name='Count')
+ 
+    unique_weeks = data['WEEK'].unique()
+    unique_weeks.sort()
+    week_options = [{'label': str(week), 'value': week} for week in unique_weeks]
+    merged_data_df = data
+ 
+refresh_data()
  
-weekly_savings_summary = calculate_savings(merged_data_df)
-lp_status_weekly = merged_data_df.groupby(['YEAR', 'WEEK', 'Lifecycle state'])['LICENSE PLATE'].nunique().unstack(fill_value=0).reset_index()
-active_lp_df = merged_data_df[(merged_data_df['Lifecycle state'] == 'Active') & (merged_data_df['REPORT TYPE'] != 'TRAILER')]
-toll_transactions_df = active_lp_df[active_lp_df['TRANSACTION TYPE'].isin(['Transponder Toll', 'Plate Toll'])]
-toll_transactions_weekly = toll_transactions_df.groupby(['YEAR', 'WEEK', 'TRANSACTION TYPE'])['LICENSE PLATE'].nunique().reset_index(name='Count')
-active_lp_weekly = active_lp_df.groupby(['YEAR', 'WEEK', 'SOURCE']).size().reset_index(name='Count')
-sla_trend_df = merged_data_df.groupby(['YEAR', 'WEEK', 'SLA MET']).size().reset_index(name='Count')
+broadcaster = live_updates.Broadcaster()
  
+def on_new_version(previous_version, version):
+    # The prerender command published new data: reload it for live fallbacks, then
+    # tell open dashboards which payloads differ from the version they were showing
+    previous_manifest = prerender.load_manifest(previous_version) if previous_version else {}
+    run_figure_work(refresh_data)
+    changed = live_updates.diff_manifests(previous_manifest, prerender.load_manifest(version))
+    broadcaster.publish('data-version', {'version': version, 'changed': changed})
  
-unique_weeks = merged_data_df['WEEK'].unique()
-unique_weeks.sort()
-week_options = [{'label': str(week), 'value': week} for week in unique_weeks]
+@app.before_request
+def start_version_watcher():
+    live_updates.watch_versions(on_new_version)
  
 @app.route('/')
 def index():
@@ -213,80 +247,147 @@ def index():
 #     response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self' https://cdn.plot.ly; style-src 'self' https://cdn.jsdelivr.net"
 #     return response
  
-@app.route('/plot_lp_status_weekly')
-def plot_lp_status_weekly_route():
-    year = request.args.get('year', type=int)
-    weeks = request.args.getlist('weeks', type=int)
+def resolve_weeks(year, weeks):
     if not weeks and year:
         weeks = merged_data_df[merged_data_df['YEAR'] == year]['WEEK'].unique()
-    fig = plot_lp_status_weekly(lp_status_weekly, weeks)
-    return jsonify(json.loads(fig.to_json()))
+    return weeks
+ 
+def figure_payload(fig):
+    return json.loads(fig.to_json())
+ 
+def lp_status_weekly_payload(year, weeks):
+    return figure_payload(plot_lp_status_weekly(lp_status_weekly, resolve_weeks(year, weeks)))
+ 
+def toll_transactions_payload(year, weeks):
+    return figure_payload(plot_toll_transactions(toll_transactions_weekly, resolve_weeks(year, weeks)))
+ 
+def active_lp_sources_payload(year, weeks):
+    return figure_payload(plot_active_lp_sources(active_lp_weekly, resolve_weeks(year, weeks)))
+ 
+def sla_trend_bar_payload(year, weeks):
+    return figure_payload(plot_sla_trend_bar(sla_trend_df, resolve_weeks(year, weeks)))
+ 
+def lp_count_weekly_payload(year, weeks):
+    return figure_payload(plot_lp_count_weekly(lp_status_weekly[lp_status_weekly['YEAR'] == year]))
+ 
+def toll_transactions_line_payload(year, weeks):
+    return figure_payload(toll_transactions_line_plot(toll_transactions_weekly[toll_transactions_weekly['YEAR'] == year]))
+ 
+def active_lp_sources_trend_payload(year, weeks):
+    return figure_payload(plot_active_lp_sources_trend(active_lp_weekly[active_lp_weekly['YEAR'] == year]))
+ 
+def sla_trend_line_payload(year, weeks):
+    return figure_payload(plot_sla_trend_line(sla_trend_df[sla_trend_df['YEAR'] == year]))
+ 
+def savings_trend_payload(year, weeks):
+    return figure_payload(plot_savings_trend(weekly_savings_summary))
+ 
+def summary_metrics_payload(year, weeks):
+    if not weeks:
+        weeks = merged_data_df['WEEK'].unique()
+    total_transactions, total_savings, active_lp_count = calculate_summary_metrics(merged_data_df, weeks)
+    return {
+        'total_transactions': int(total_transactions),
+        'total_savings': float(total_savings),
+        'active_lp_count': int(active_lp_count)
+    }
+ 
+# Payload builders keyed by route name. The scope says which query parameters the
+# route honours: 'weeks' (year or week list), 'week' (week list only),
+# 'year' (year only) or 'all' (none).
+PAYLOADS = {
+    'plot_lp_status_weekly': ('weeks', lp_status_weekly_payload),
+    'plot_toll_transactions': ('weeks', toll_transactions_payload),
+    'plot_active_lp_sources': ('weeks', active_lp_sources_payload),
+    'plot_sla_trend_bar': ('weeks', sla_trend_bar_payload),
+    'plot_lp_count_weekly': ('year', lp_count_weekly_payload),
+    'toll_transactions_line_plot': ('year', toll_transactions_line_payload),
+    'plot_active_lp_sources_trend': ('year', active_lp_sources_trend_payload),
+    'plot_sla_trend_line': ('year', sla_trend_line_payload),
+    'plot_savings_trend': ('all', savings_trend_payload),
+    'summary_metrics': ('week', summary_metrics_payload),
+}
+ 
+def prerendered_response(name, year, weeks):
+    scope = PAYLOADS[name][0]
+    path = prerender.lookup(DATA_VERSION, name, prerender.payload_key(scope, year, weeks))
+    if path is None:
+        return None
+    if 'gzip' in request.accept_encodings:
+        response = send_file(path, mimetype='application/json', conditional=True)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        with gzip.open(path, 'rb') as f:
+            response = make_response(f.read())
+        response.mimetype = 'application/json'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+ 
+def normalize_params(scope, year, weeks):
+    # Drop the parameters a route ignores so equivalent requests look identical
+    weeks = sorted(set(weeks))
+    if scope == 'all':
+        return None, []
+    if scope == 'year':
+        return year, []
+    if scope == 'week' or weeks:
+        return None, weeks
+    return year, []
+ 
+def render_payload(build_payload, year, weeks):
+    return app.json.dumps(build_payload(year, weeks))
+ 
+coalescer = single_flight.SingleFlight()
+ 
+def payload_response(name):
+    scope, build_payload = PAYLOADS[name]
+    year, weeks = normalize_params(scope, request.args.get('year', type=int), request.args.getlist('weeks', type=int))
+    response = prerendered_response(name, year, weeks)
+    if response is None:
+        # Unusual week combinations fall back to live computation; concurrent identical
+        # requests against the same data version share a single build
+        key = (name, DATA_VERSION, year, tuple(weeks))
+        body = coalescer.do(key, lambda: run_figure_work(render_payload, build_payload, year, weeks))
+        response = app.response_class(body, mimetype='application/json')
+    return response
+ 
+@app.route('/plot_lp_status_weekly')
+def plot_lp_status_weekly_route():
+    return payload_response('plot_lp_status_weekly')
  
 @app.route('/plot_toll_transactions')
 def plot_toll_transactions_route():
-    year = request.args.get('year', type=int)
-    weeks = request.args.getlist('weeks', type=int)
-    if not weeks and year:
-        weeks = merged_data_df[merged_data_df['YEAR'] == year]['WEEK'].unique()
-    fig = plot_toll_transactions(toll_transactions_weekly, weeks)
-    return jsonify(json.loads(fig.to_json()))
+    return payload_response('plot_toll_transactions')
  
 @app.route('/plot_active_lp_sources')
 def plot_active_lp_sources_route():
-    year = request.args.get('year', type=int)
-    weeks = request.args.getlist('weeks', type=int)
-    if not weeks and year:
-        weeks = merged_data_df[merged_data_df['YEAR'] == year]['WEEK'].unique()
-    fig = plot_active_lp_sources(active_lp_weekly, weeks)
-    return jsonify(json.loads(fig.to_json()))
+    return payload_response('plot_active_lp_sources')
  
 @app.route('/plot_sla_trend_bar')
 def plot_sla_trend_bar_route():
-    year = request.args.get('year', type=int)
-    weeks = request.args.getlist('weeks', type=int)
-    if not weeks and year:
-        weeks = merged_data_df[merged_data_df['YEAR'] == year]['WEEK'].unique()
-    fig = plot_sla_trend_bar(sla_trend_df, weeks)
-    return jsonify(json.loads(fig.to_json()))
+    return payload_response('plot_sla_trend_bar')
  
  
 @app.route('/plot_lp_count_weekly')
 def plot_lp_count_weekly_route():
-    year = request.args.get('year', type=int)
-    weeks = request.args.getlist('weeks', type=int)
-    filtered_data = lp_status_weekly[lp_status_weekly['YEAR'] == year]
-    fig = plot_lp_count_weekly(filtered_data)
-    return jsonify(json.loads(fig.to_json()))
+    return payload_response('plot_lp_count_weekly')
  
 @app.route('/toll_transactions_line_plot')
 def toll_transactions_line_plot_route():
-    year = request.args.get('year', type=int)
-    weeks = request.args.getlist('weeks', type=int)
-    filtered_data = toll_transactions_weekly[toll_transactions_weekly['YEAR'] == year]
-    fig = toll_transactions_line_plot(filtered_data)
-    return jsonify(json.loads(fig.to_json()))
+    return payload_response('toll_transactions_line_plot')
  
 @app.route('/plot_active_lp_sources_trend')
 def plot_active_lp_sources_trend_route():
-    year = request.args.get('year', type=int)
-    weeks = request.args.getlist('weeks', type=int)
-    filtered_data = active_lp_weekly[active_lp_weekly['YEAR'] == year]
-    fig = plot_active_lp_sources_trend(filtered_data)
-    return jsonify(json.loads(fig.to_json()))
+    return payload_response('plot_active_lp_sources_trend')
  
 @app.route('/plot_sla_trend_line')
 def plot_sla_trend_line_route():
-    year = request.args.get('year', type=int)
-    weeks = request.args.getlist('weeks', type=int)
-    filtered_data = sla_trend_df[sla_trend_df['YEAR'] == year]
-    fig = plot_sla_trend_line(filtered_data)
-    return jsonify(json.loads(fig.to_json()))
+    return payload_response('plot_sla_trend_line')
  
  
 @app.route('/plot_savings_trend')
 def calculate_savings_route():
-    fig = plot_savings_trend(weekly_savings_summary)
-    return jsonify(json.loads(fig.to_json()))
+    return payload_response('plot_savings_trend')
  
 @app.route('/get_years')
 def get_years():
@@ -306,16 +407,15 @@ def get_weeks():
    
 @app.route('/summary_metrics')
 def summary_metrics_route():
-    weeks = request.args.getlist('weeks', type=int)
-    if not weeks:
-        weeks = merged_data_df['WEEK'].unique()
+    return payload_response('summary_metrics')
  
-    total_transactions, total_savings, active_lp_count = calculate_summary_metrics(merged_data_df, weeks)
-    return jsonify({
-        'total_transactions': total_transactions,
-        'total_savings': total_savings,
-        'active_lp_count': active_lp_count
-    })
+@app.route('/updates')
+def updates_route():
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    response = Response(broadcaster.stream(last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
  
 @app.route('/set_cookie')
 def set_cookie():
@@ -328,8 +428,32 @@ def get_cookie():
     cookie_value = request.cookies.get('my_cookie')
     return f'Cookie Value: {cookie_value}'
  
+def prerender_jobs():
+    years = sorted(int(year) for year in merged_data_df['YEAR'].unique())
+    year_entries = [(str(year), year, []) for year in years]
+    week_entries = [(f'w{week}', None, [int(week)]) for week in unique_weeks]
+    entries = {
+        'all': [('all', None, [])],
+        'week': [('all', None, [])] + week_entries,
+        'year': year_entries,
+        'weeks': year_entries + week_entries,
+    }
+    for name, (scope, build_payload) in PAYLOADS.items():
+        for key, year, weeks in entries[scope]:
+            yield name, key, build_payload(year, weeks)
+ 
+@app.cli.command('prerender')
+def prerender_command():
+    # Run after each data refresh: flask --app Flask prerender
+    payloads = prerender.build(DATA_VERSION, prerender_jobs())
+    print(f"Pre-rendered {len(payloads)} payloads to {os.path.join(prerender.PRERENDER_DIR, DATA_VERSION)}")
+ 
 if __name__ == '__main__':
     try:
-        app.run(host='0.0.0.0', port = 5000, debug=True)
+        if SERVE_MODE == "gevent":
+            from gevent.pywsgi import WSGIServer
+            WSGIServer(('0.0.0.0', 5000), app).serve_forever()
+        else:
+            app.run(host='0.0.0.0', port = 5000, debug=True, threaded=True)
     except Exception as e:
         print(f"An error occurred: {e}")
\ No newline at end of file
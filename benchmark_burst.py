@@ -0,0 +1,59 @@
+# benchmark_burst.py
+#
+# Fires a burst of identical concurrent requests at a running dashboard server
+# (like everyone opening the weekly report at once) and reports throughput.
+# While the burst runs, a cheap route is polled to show whether it gets starved.
+#
+#   python benchmark_burst.py --url http://localhost:5000 --path "/plot_lp_status_weekly?weeks=1&weeks=2&year=2024"
+
+import argparse
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def timed_get(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def poll_cheap_route(url, stop, latencies):
+    while not stop.is_set():
+        latencies.append(timed_get(url))
+        time.sleep(0.05)
+
+
+def run_burst(base_url, path, requests, concurrency, cheap_path='/get_years'):
+    stop = threading.Event()
+    cheap_latencies = []
+    poller = threading.Thread(target=poll_cheap_route, args=(base_url + cheap_path, stop, cheap_latencies), daemon=True)
+    poller.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed_get, [base_url + path] * requests))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    poller.join()
+
+    print(f"{requests} x {path} with concurrency {concurrency}")
+    print(f"  throughput: {requests / elapsed:.1f} req/s ({elapsed:.2f}s total)")
+    print(f"  latency: median {statistics.median(latencies) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms")
+    if cheap_latencies:
+        print(f"  {cheap_path} during burst: median {statistics.median(cheap_latencies) * 1000:.0f} ms, "
+              f"max {max(cheap_latencies) * 1000:.0f} ms over {len(cheap_latencies)} requests")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark a burst of identical dashboard requests")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--path', default='/plot_lp_status_weekly?weeks=1&weeks=2&year=2024')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    run_burst(args.url, args.path, args.requests, args.concurrency)
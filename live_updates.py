@@ -0,0 +1,103 @@
+# live_updates.py
+#
+# Server-Sent Events for open dashboards. A watcher notices when the prerender
+# command publishes a new data version, and the broadcaster tells connected
+# pages which chart payloads changed so they refetch only those.
+
+import collections
+import json
+import threading
+import time
+
+import prerender
+
+
+def diff_manifests(old_manifest, new_manifest):
+    # Returns {chart: [keys]} for payloads that were added, removed or whose content changed
+    old_payloads = old_manifest.get('payloads', {})
+    new_payloads = new_manifest.get('payloads', {})
+    changed = collections.defaultdict(list)
+    for entry in sorted(set(old_payloads) | set(new_payloads)):
+        if old_payloads.get(entry) != new_payloads.get(entry):
+            name, key = entry.split('/', 1)
+            changed[name].append(key)
+    return dict(changed)
+
+
+def format_event(event_id, event, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+
+class Broadcaster:
+    # Subscribers share one bounded event history and only remember the last id they sent,
+    # so an idle connection costs a generator frame rather than a queue of its own.
+
+    def __init__(self, history=32, heartbeat=15):
+        self.heartbeat = heartbeat
+        self._condition = threading.Condition()
+        self._events = collections.deque(maxlen=history)
+        self._last_id = 0
+
+    def publish(self, event, payload):
+        with self._condition:
+            self._last_id += 1
+            self._events.append((self._last_id, event, json.dumps(payload, separators=(',', ':'))))
+            self._condition.notify_all()
+
+    def stream(self, last_event_id=None):
+        yield 'retry: 5000\n\n'
+        with self._condition:
+            latest = self._last_id
+        if last_event_id is None:
+            last_event_id = latest
+        elif not 0 <= last_event_id <= latest:
+            # Reconnect after a server restart; the page cannot know what it missed
+            yield format_event(latest, 'reload', '{}')
+            last_event_id = latest
+
+        while True:
+            with self._condition:
+                if self._last_id == last_event_id:
+                    self._condition.wait(self.heartbeat)
+                pending = [event for event in self._events if event[0] > last_event_id]
+                missed = bool(pending) and pending[0][0] > last_event_id + 1
+                latest = self._last_id
+
+            if missed:
+                # Older events already fell out of the history, so ask for a full refresh
+                yield format_event(latest, 'reload', '{}')
+                last_event_id = latest
+            elif pending:
+                for event_id, event, data in pending:
+                    yield format_event(event_id, event, data)
+                    last_event_id = event_id
+            else:
+                yield ': keep-alive\n\n'
+
+
+_watcher_lock = threading.Lock()
+_watcher = None
+
+
+def watch_versions(on_change, interval=5, root=prerender.PRERENDER_DIR):
+    # Polls the CURRENT pointer written by the prerender command; starts at most one watcher per process
+    global _watcher
+    with _watcher_lock:
+        if _watcher is not None:
+            return _watcher
+
+        def run():
+            seen = prerender.current_version(root)
+            while True:
+                time.sleep(interval)
+                version = prerender.current_version(root)
+                if version and version != seen:
+                    try:
+                        on_change(seen, version)
+                        seen = version
+                    except Exception as e:
+                        print(f"An error occurred while loading data version {version}: {e}")
+
+        _watcher = threading.Thread(target=run, name='prerender-watcher', daemon=True)
+        _watcher.start()
+        return _watcher
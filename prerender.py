@@ -0,0 +1,106 @@
+# prerender.py
+#
+# Static store for dashboard payloads. After each data refresh the build
+# command renders every year / single-week figure to
+# <PRERENDER_DIR>/<data version>/<chart>/<key>.json.gz so Flask can serve
+# them as files instead of running pandas and Plotly per request.
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+PRERENDER_DIR = os.getenv("PRERENDER_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prerendered"))
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+
+def data_version(data):
+    # Content hash of the loaded frame, so identical data always maps to the same directory
+    row_hashes = pd.util.hash_pandas_object(data, index=False).values
+    digest = hashlib.sha256(row_hashes.tobytes())
+    digest.update(",".join(map(str, data.columns)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def payload_key(scope, year, weeks):
+    # Only whole-year views and single weeks are materialized; anything else returns None
+    if scope == 'all':
+        return 'all'
+    if scope == 'year' or (scope == 'weeks' and not weeks):
+        return str(year) if year is not None else None
+    if not weeks:
+        return 'all'
+    if len(weeks) == 1:
+        return f'w{weeks[0]}'
+    return None
+
+
+def payload_path(version, name, key, root=PRERENDER_DIR):
+    return os.path.join(root, version, name, f'{key}.json.gz')
+
+
+def lookup(version, name, key, root=PRERENDER_DIR):
+    if key is None:
+        return None
+    path = payload_path(version, name, key, root)
+    return path if os.path.isfile(path) else None
+
+
+def current_version(root=PRERENDER_DIR):
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest(version, root=PRERENDER_DIR):
+    try:
+        with open(os.path.join(root, version, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'version': version, 'payloads': {}}
+
+
+def build(version, jobs, root=PRERENDER_DIR):
+    # jobs yields (name, key, payload) tuples; payload must already be plain JSON types.
+    # Files are written to a staging directory and swapped in whole, so readers never see a half-built version.
+    staging = os.path.join(root, f'.{version}.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+
+    payloads = {}
+    for name, key, payload in jobs:
+        body = json.dumps(payload, separators=(',', ':')).encode("utf-8")
+        path = payload_path('', name, key, staging)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(gzip.compress(body, compresslevel=9, mtime=0))
+        payloads[f'{name}/{key}'] = hashlib.sha256(body).hexdigest()
+
+    with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding="utf-8") as f:
+        json.dump({'version': version, 'payloads': payloads}, f, indent=1, sort_keys=True)
+
+    target = os.path.join(root, version)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+
+    previous = current_version(root)
+    pointer = os.path.join(root, f'.{CURRENT_FILE}.tmp')
+    with open(pointer, 'w', encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+
+    prune(root, keep={version, previous})
+    return payloads
+
+
+def prune(root=PRERENDER_DIR, keep=()):
+    # Keep the new and the previous version so servers still on the old data keep their files
+    for entry in os.listdir(root):
+        path = os.path.join(root, entry)
+        if entry not in keep and not entry.startswith('.') and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
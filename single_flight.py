@@ -0,0 +1,38 @@
+# single_flight.py
+#
+# Request coalescing: concurrent callers asking for the same key share one
+# in-progress computation instead of each running it.
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, compute):
+        # The first caller for a key runs compute(); callers arriving while it runs wait for its result.
+        # Nothing is cached afterwards, so the next request after completion computes again.
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]